@@ -0,0 +1,9 @@
+"""Chainlit entry point mounted by main.py.
+
+Chainlit executes its target by file path under its own module name. Pointing
+it at chatbot.py directly would run that module a second time (and create a
+second assistant), so this file only imports the package module, which
+registers the Chainlit handlers once.
+"""
+
+import interactive_sketchpad.chatbot  # noqa: F401
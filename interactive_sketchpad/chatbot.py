@@ -1,4 +1,5 @@
 import json
+import logging
 import os
 from pathlib import Path
 from typing import List
@@ -14,6 +15,8 @@ from interactive_sketchpad.prompt import GeoPrompt
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 async_openai_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 sync_openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
@@ -94,30 +97,20 @@ assistant = sync_openai_client.beta.assistants.create(
 
 async def send_image_to_sketchpad(image_bytes: bytes):
     """Send an image to the web-based sketchpad via WebSocket."""
-    import base64
-    from interactive_sketchpad.state import get_sketchpad_connection, get_all_sketchpad_connections
-
-    print(f"[CHATBOT] send_image_to_sketchpad called, image size={len(image_bytes)} bytes")
-
-    connections = get_all_sketchpad_connections()
-    print(f"[CHATBOT] Available connections: {list(connections.keys())}")
+    from interactive_sketchpad.state import (
+        FRAME_TYPE_IMAGE_PNG,
+        LazyKeys,
+        enqueue_sketchpad_record,
+        get_all_sketchpad_connections,
+    )
 
-    websocket = get_sketchpad_connection("default")
-    if websocket:
-        try:
-            base64_image = base64.b64encode(image_bytes).decode("utf-8")
-            print(f"[CHATBOT] Sending base64 image, length={len(base64_image)}")
-            await websocket.send_json(
-                {"type": "image", "image": f"data:image/png;base64,{base64_image}"}
-            )
-            print("[CHATBOT] SUCCESS - Image sent to sketchpad!")
-        except Exception as e:
-            print(f"[CHATBOT] ERROR sending image: {e}")
-            import traceback
+    logger.debug("send_image_to_sketchpad called, image size=%d bytes", len(image_bytes))
+    logger.debug("Available connections: %s", LazyKeys(get_all_sketchpad_connections()))
 
-            traceback.print_exc()
+    if enqueue_sketchpad_record("default", FRAME_TYPE_IMAGE_PNG, image_bytes):
+        logger.debug("Image queued for sketchpad")
     else:
-        print("[CHATBOT] FAILED - No WebSocket connection available")
+        logger.warning("Image was not queued for sketchpad")
 
 
 class EventHandler(AsyncAssistantEventHandler):
@@ -172,10 +165,10 @@ class EventHandler(AsyncAssistantEventHandler):
         await self.current_step.update()
 
     async def on_image_file_done(self, image_file, show_image: bool = False):
-        print(f"[CHATBOT] on_image_file_done called, file_id={image_file.file_id}")
+        logger.debug("on_image_file_done called, file_id=%s", image_file.file_id)
         image_id = image_file.file_id
         response = await async_openai_client.files.with_raw_response.content(image_id)
-        print(f"[CHATBOT] Downloaded image, size={len(response.content)} bytes")
+        logger.debug("Downloaded image, size=%d bytes", len(response.content))
 
         if show_image:
             # Show image in chatbot interface
@@ -188,9 +181,7 @@ class EventHandler(AsyncAssistantEventHandler):
             await self.current_message.update()
 
         # Send image to web-based sketchpad
-        print("[CHATBOT] About to send image to sketchpad...")
         await send_image_to_sketchpad(response.content)
-        print("[CHATBOT] Image sent to sketchpad completed")
 
 
 async def upload_files(files: List[Element], purpose: str = "assistants"):
@@ -237,7 +228,7 @@ async def start_chat():
     thread = await async_openai_client.beta.threads.create()
     cl.user_session.set("thread_id", thread.id)
     session_id = cl.user_session.get("id")
-    print("Session id:", session_id)
+    logger.debug("Session id: %s", session_id)
 
     # Register this session as the latest (for single-user mode)
     from interactive_sketchpad.state import set_latest_chainlit_session
@@ -1,36 +1,113 @@
-import base64
+import atexit
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
 import tempfile
+from typing import BinaryIO
+from urllib.parse import parse_qs
 
+import anyio
 import chainlit as cl
 from chainlit.context import init_ws_context
 from chainlit.session import WebsocketSession
 from chainlit.utils import mount_chainlit
-from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, File, Request, UploadFile, WebSocket
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
+from PIL import Image
 
 # Import shared state - this is the single source of truth
 from interactive_sketchpad.state import (
+    FRAME_TYPE_IMAGE_PNG,
+    LazyKeys,
     add_sketchpad_connection,
+    enqueue_sketchpad_record,
     remove_sketchpad_connection,
-    get_sketchpad_connection,
     get_all_sketchpad_connections,
     get_latest_chainlit_session,
     set_latest_chainlit_session,
 )
+from interactive_sketchpad.chatbot import main as chatbot_main
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def configure_logging(level: int = logging.INFO):
+    """Route package logs through a queue so stream I/O happens off the event loop."""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("[%(name)s] %(levelname)s %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    package_logger = logging.getLogger("interactive_sketchpad")
+    package_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    package_logger.setLevel(level)
+    package_logger.propagate = False
+
+
+configure_logging()
+
+
+class VersionedStaticFiles(StaticFiles):
+    """StaticFiles that lets browsers keep content-hashed (?v=...) assets forever.
+
+    An asset is only marked immutable while ``?v=`` matches the hash from
+    asset_version and the file is unchanged since that hash was taken. An asset
+    edited without a restart falls back to normal ETag revalidation.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._versions: dict[str, tuple[str, int, int]] = {}
+
+    def asset_version(self, path: str) -> str:
+        """Short content hash of an asset, used to cache-bust its URL."""
+        full_path, stat_result = self.lookup_path(path)
+        if stat_result is None:
+            raise FileNotFoundError(path)
+        version = hashlib.blake2b(Path(full_path).read_bytes(), digest_size=8).hexdigest()
+        self._versions[full_path] = (version, stat_result.st_mtime_ns, stat_result.st_size)
+        return version
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        recorded = (query.get("v", [None])[0], stat_result.st_mtime_ns, stat_result.st_size)
+        if recorded == self._versions.get(str(full_path)):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
 
 app = FastAPI()
 
 # Serve static files (for CSS, images, etc.)
 public_path = Path(__file__).parent / "public"
-app.mount("/static", StaticFiles(directory=public_path), name="static")
+static_files = VersionedStaticFiles(directory=public_path)
+app.mount("/static", static_files, name="static")
 
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    """Serve the main page with side-by-side layout."""
-    return """
+def html_cache_headers(content: bytes) -> dict:
+    """Cache-Control and a strong blake2b ETag for a pre-encoded HTML page."""
+    etag = f'"{hashlib.blake2b(content, digest_size=8).hexdigest()}"'
+    return {"Cache-Control": "public, max-age=3600", "ETag": etag}
+
+
+def cached_html_response(request: Request, content: bytes, headers: dict) -> Response:
+    """Serve pre-encoded HTML, answering a matching If-None-Match with 304."""
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="text/html", headers=headers)
+
+
+ROOT_HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -40,98 +117,8 @@ async def root():
     <link rel="preconnect" href="https://fonts.googleapis.com">
     <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
     <link href="https://fonts.googleapis.com/css2?family=Outfit:wght@400;500;600&display=swap" rel="stylesheet">
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Outfit', sans-serif;
-            background: #0a0a0f;
-            height: 100vh;
-            overflow: hidden;
-        }
-        
-        .container {
-            display: flex;
-            height: 100vh;
-            width: 100vw;
-        }
-        
-        .panel {
-            flex: 1;
-            height: 100%;
-            position: relative;
-        }
-        
-        .panel iframe {
-            width: 100%;
-            height: 100%;
-            border: none;
-        }
-        
-        .divider {
-            width: 4px;
-            background: linear-gradient(180deg, #6366f1 0%, #8b5cf6 100%);
-            cursor: col-resize;
-            position: relative;
-            transition: width 0.15s ease;
-        }
-        
-        .divider:hover {
-            width: 6px;
-        }
-        
-        .divider::before {
-            content: '';
-            position: absolute;
-            top: 50%;
-            left: 50%;
-            transform: translate(-50%, -50%);
-            width: 4px;
-            height: 40px;
-            background: rgba(255, 255, 255, 0.3);
-            border-radius: 2px;
-        }
-        
-        .loading-overlay {
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background: #0a0a0f;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            gap: 16px;
-            color: #8888a0;
-            font-size: 14px;
-            z-index: 10;
-            transition: opacity 0.3s ease;
-        }
-        
-        .loading-overlay.hidden {
-            opacity: 0;
-            pointer-events: none;
-        }
-        
-        .spinner {
-            width: 32px;
-            height: 32px;
-            border: 3px solid rgba(99, 102, 241, 0.2);
-            border-top-color: #6366f1;
-            border-radius: 50%;
-            animation: spin 1s linear infinite;
-        }
-        
-        @keyframes spin {
-            to { transform: rotate(360deg); }
-        }
-    </style>
+    <link rel="stylesheet" href="/static/app.css?v={app_css_version}">
+    <script src="/static/app.js?v={app_js_version}" defer></script>
 </head>
 <body>
     <div class="container">
@@ -148,69 +135,38 @@ async def root():
                 <div class="spinner"></div>
                 <span>Loading sketchpad...</span>
             </div>
-            <iframe id="sketchpadFrame" src="/sketchpad"></iframe>
+            <div class="sketchpad-host" id="sketchpadHost"></div>
         </div>
     </div>
-    
-    <script>
-        const chatFrame = document.getElementById('chatFrame');
-        const sketchpadFrame = document.getElementById('sketchpadFrame');
-        const chatLoading = document.getElementById('chatLoading');
-        const sketchpadLoading = document.getElementById('sketchpadLoading');
-        
-        chatFrame.addEventListener('load', () => {
-            chatLoading.classList.add('hidden');
-        });
-        
-        sketchpadFrame.addEventListener('load', () => {
-            sketchpadLoading.classList.add('hidden');
-        });
-        
-        // Resizable divider
-        const divider = document.getElementById('divider');
-        const chatPanel = document.getElementById('chatPanel');
-        const sketchpadPanel = document.getElementById('sketchpadPanel');
-        
-        let isResizing = false;
-        
-        divider.addEventListener('mousedown', (e) => {
-            isResizing = true;
-            document.body.style.cursor = 'col-resize';
-            document.body.style.userSelect = 'none';
-            chatFrame.style.pointerEvents = 'none';
-            sketchpadFrame.style.pointerEvents = 'none';
-        });
-        
-        document.addEventListener('mousemove', (e) => {
-            if (!isResizing) return;
-            
-            const containerWidth = document.querySelector('.container').offsetWidth;
-            const percentage = (e.clientX / containerWidth) * 100;
-            const clampedPercentage = Math.max(20, Math.min(80, percentage));
-            
-            chatPanel.style.flex = `0 0 ${clampedPercentage}%`;
-            sketchpadPanel.style.flex = `0 0 ${100 - clampedPercentage}%`;
-        });
-        
-        document.addEventListener('mouseup', () => {
-            if (isResizing) {
-                isResizing = false;
-                document.body.style.cursor = '';
-                document.body.style.userSelect = '';
-                chatFrame.style.pointerEvents = '';
-                sketchpadFrame.style.pointerEvents = '';
-            }
-        });
-    </script>
 </body>
 </html>
 """
+ROOT_HTML = ROOT_HTML_TEMPLATE.format(
+    app_css_version=static_files.asset_version("app.css"),
+    app_js_version=static_files.asset_version("app.js"),
+)
+
+# Encode the main page and compute its ETag once instead of on every request
+_ROOT_HTML_BYTES = ROOT_HTML.encode("utf-8")
+_ROOT_HTML_HEADERS = html_cache_headers(_ROOT_HTML_BYTES)
+
+
+@app.get("/", response_class=HTMLResponse)
+async def root(request: Request):
+    """Serve the main page with side-by-side layout."""
+    return cached_html_response(request, _ROOT_HTML_BYTES, _ROOT_HTML_HEADERS)
+
 
+# The sketchpad page is read once, like the main page, so its body and headers
+# always agree; edits to it need a restart
+_SKETCHPAD_HTML_BYTES = (public_path / "sketchpad.html").read_bytes()
+_SKETCHPAD_HTML_HEADERS = html_cache_headers(_SKETCHPAD_HTML_BYTES)
 
-@app.get("/sketchpad")
-async def serve_sketchpad():
+
+@app.get("/sketchpad", response_class=HTMLResponse)
+async def serve_sketchpad(request: Request):
     """Serve the sketchpad HTML page."""
-    return FileResponse(public_path / "sketchpad.html")
+    return cached_html_response(request, _SKETCHPAD_HTML_BYTES, _SKETCHPAD_HTML_HEADERS)
 
 
 @app.get("/api/session")
@@ -222,44 +178,70 @@ async def get_session():
 @app.websocket("/ws/sketchpad")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time communication with sketchpad."""
+    # No TCP_NODELAY tweak needed here: asyncio and uvloop transports already
+    # disable Nagle on every TCP socket they create
     await websocket.accept()
     
     # Use a simple connection key - store as "default" for single-user mode
     connection_id = id(websocket)
     add_sketchpad_connection("default", websocket)
-    print(f"[SKETCHPAD-WS] Connected! ID={connection_id}")
+    logger.debug("Sketchpad connected: id=%s", connection_id)
     
     try:
+        # The sketchpad never sends anything we act on, so read raw ASGI
+        # messages without decoding them and only watch for the disconnect
         while True:
-            data = await websocket.receive_text()
-            print(f"[SKETCHPAD-WS] Received: {data}")
-    except WebSocketDisconnect:
-        remove_sketchpad_connection("default")
-        print(f"[SKETCHPAD-WS] Disconnected! ID={connection_id}")
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Sketchpad received: %s", message.get("text") or message.get("bytes"))
+    finally:
+        remove_sketchpad_connection("default", websocket)
+        logger.debug("Sketchpad disconnected: id=%s", connection_id)
 
 
 async def send_image_to_sketchpad_ws(image_bytes: bytes):
     """Send an image to the sketchpad via WebSocket."""
-    connections = get_all_sketchpad_connections()
-    print(f"[SKETCHPAD-SEND] Attempting to send image, size={len(image_bytes)} bytes")
-    print(f"[SKETCHPAD-SEND] Available connections: {list(connections.keys())}")
+    logger.debug("Attempting to send image, size=%d bytes", len(image_bytes))
+    logger.debug("Available connections: %s", LazyKeys(get_all_sketchpad_connections()))
     
-    websocket = get_sketchpad_connection("default")
-    if websocket:
-        try:
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            print(f"[SKETCHPAD-SEND] Sending base64 image, length={len(base64_image)}")
-            await websocket.send_json({
-                "type": "image",
-                "image": f"data:image/png;base64,{base64_image}"
-            })
-            print("[SKETCHPAD-SEND] SUCCESS - Image sent to sketchpad!")
-        except Exception as e:
-            print(f"[SKETCHPAD-SEND] ERROR sending image: {e}")
-            import traceback
-            traceback.print_exc()
+    if enqueue_sketchpad_record("default", FRAME_TYPE_IMAGE_PNG, image_bytes):
+        logger.debug("Image queued for sketchpad")
+    else:
+        logger.warning("Image was not queued for sketchpad (key 'default')")
+
+
+def save_upload(source: BinaryIO, suffix: str) -> str:
+    """Copy an upload to a new temp file in fixed-size chunks, returning its path."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        shutil.copyfileobj(source, temp_file, UPLOAD_CHUNK_SIZE)
+        return temp_file.name
+
+
+def compress_image(path: str):
+    """Losslessly recompress a PNG in place if that makes it smaller.
+
+    The file stays a PNG because it is also attached to the assistant for
+    code_interpreter, which does not accept WebP.
+    """
+    root, ext = os.path.splitext(path)
+    optimized_path = f"{root}.optimized{ext}"
+    try:
+        with Image.open(path) as img:
+            if img.format != "PNG":
+                return
+            img.save(optimized_path, format="PNG", optimize=True)
+    except OSError:
+        logger.exception("Could not recompress %s", path)
+        if os.path.exists(optimized_path):
+            os.remove(optimized_path)
+        return
+
+    if os.path.getsize(optimized_path) < os.path.getsize(path):
+        os.replace(optimized_path, path)
     else:
-        print("[SKETCHPAD-SEND] FAILED - No WebSocket connection available (key 'default' not found)")
+        os.remove(optimized_path)
 
 
 # Handle uploaded images from sketchpad
@@ -268,40 +250,36 @@ async def upload_image(
     text: str = "Here's my working so far, can you help me?",
     file: UploadFile = File(...),
 ):
-    # Import here to avoid circular imports
-    from interactive_sketchpad.chatbot import main
-    
     # Use the latest Chainlit session
     chainlit_session_id = get_latest_chainlit_session()
     
     if not chainlit_session_id:
-        print("No Chainlit session available")
+        logger.warning("No Chainlit session available")
         return {"error": "No chat session available. Please start a chat first."}
     
     ws_session = WebsocketSession.get_by_id(session_id=chainlit_session_id)
     if not ws_session:
-        print(f"WebsocketSession not found for: {chainlit_session_id}")
+        logger.warning("WebsocketSession not found for: %s", chainlit_session_id)
         return {"error": "Chat session not found"}
     
     init_ws_context(ws_session)
 
-    content = await file.read()
+    # Copy the upload to disk on a worker thread so the event loop stays free
+    temp_file_path = await anyio.to_thread.run_sync(save_upload, file.file, file.filename)
+
+    # Browser canvas PNGs are written with little compression
+    await anyio.to_thread.run_sync(compress_image, temp_file_path)
 
     image_element = cl.Image(
-        name=file.filename, content=content, display="inline", size="large"
+        name=file.filename, path=temp_file_path, display="inline", size="large"
     )
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=file.filename) as temp_file:
-        temp_file.write(content)
-        temp_file_path = temp_file.name
-        image_element.path = temp_file_path
-
-        message = cl.Message(content=text, elements=[image_element])
-        await message.send()
-        await main(message)
+    message = cl.Message(content=text, elements=[image_element])
+    await message.send()
+    await chatbot_main(message)
 
     return {"message": "Image received"}
 
 
 # Mount Chainlit at /chat path
-mount_chainlit(app=app, target="interactive_sketchpad/chatbot.py", path="/chat")
+mount_chainlit(app=app, target="interactive_sketchpad/chainlit_app.py", path="/chat")
@@ -0,0 +1,76 @@
+const chatFrame = document.getElementById('chatFrame');
+const sketchpadHost = document.getElementById('sketchpadHost');
+const chatLoading = document.getElementById('chatLoading');
+const sketchpadLoading = document.getElementById('sketchpadLoading');
+
+chatFrame.addEventListener('load', () => {
+    chatLoading.classList.add('hidden');
+});
+
+// Mount the sketchpad into a shadow root instead of a second iframe
+async function mountSketchpad() {
+    const response = await fetch('/sketchpad');
+    if (!response.ok) {
+        throw new Error(`GET /sketchpad returned ${response.status}`);
+    }
+    const html = await response.text();
+    const sketchpadDoc = new DOMParser().parseFromString(html, 'text/html');
+    const shadow = sketchpadHost.attachShadow({ mode: 'open' });
+
+    // Font stylesheets only take effect from the main document
+    sketchpadDoc.head.querySelectorAll('link').forEach((link) => document.head.appendChild(link));
+    sketchpadDoc.head.querySelectorAll('style').forEach((style) => shadow.appendChild(style));
+
+    // Scripts inserted via the parser never run, so re-create them
+    const scripts = [...sketchpadDoc.body.querySelectorAll('script')];
+    scripts.forEach((script) => script.remove());
+    shadow.append(...sketchpadDoc.body.childNodes);
+
+    window.sketchpadRoot = shadow;
+    scripts.forEach((script) => {
+        const runnable = document.createElement('script');
+        runnable.textContent = script.textContent;
+        document.body.appendChild(runnable);
+    });
+    sketchpadLoading.classList.add('hidden');
+}
+
+mountSketchpad().catch((error) => {
+    console.error('Error loading sketchpad:', error);
+    sketchpadLoading.classList.add('error');
+    sketchpadLoading.querySelector('span').textContent = 'Failed to load sketchpad. Refresh to try again.';
+});
+
+// Resizable divider
+const divider = document.getElementById('divider');
+const chatPanel = document.getElementById('chatPanel');
+const sketchpadPanel = document.getElementById('sketchpadPanel');
+
+let isResizing = false;
+
+divider.addEventListener('mousedown', (e) => {
+    isResizing = true;
+    document.body.style.cursor = 'col-resize';
+    document.body.style.userSelect = 'none';
+    chatFrame.style.pointerEvents = 'none';
+});
+
+document.addEventListener('mousemove', (e) => {
+    if (!isResizing) return;
+
+    const containerWidth = document.querySelector('.container').offsetWidth;
+    const percentage = (e.clientX / containerWidth) * 100;
+    const clampedPercentage = Math.max(20, Math.min(80, percentage));
+
+    chatPanel.style.flex = `0 0 ${clampedPercentage}%`;
+    sketchpadPanel.style.flex = `0 0 ${100 - clampedPercentage}%`;
+});
+
+document.addEventListener('mouseup', () => {
+    if (isResizing) {
+        isResizing = false;
+        document.body.style.cursor = '';
+        document.body.style.userSelect = '';
+        chatFrame.style.pointerEvents = '';
+    }
+});
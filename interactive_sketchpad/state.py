@@ -1,46 +1,185 @@
 """Shared state module to avoid circular import issues."""
 
-from typing import Dict, Optional
+import asyncio
+import contextlib
+import logging
+import struct
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 from fastapi import WebSocket
 
-# Store WebSocket connections - shared across all modules
-sketchpad_connections: Dict[str, WebSocket] = {}
+logger = logging.getLogger(__name__)
 
-# Store the latest Chainlit session ID (for single-user mode)
-latest_chainlit_session: Optional[str] = None
+# Record type tags (first byte of every record sent to the sketchpad)
+FRAME_TYPE_IMAGE_PNG = b"\x01"
+
+# Cap on tracked connections; the least recently used one is evicted past this
+MAX_SKETCHPAD_CONNECTIONS = 256
+
+# Records waiting per connection; further records are dropped until it drains
+SKETCHPAD_SEND_QUEUE_SIZE = 8
+
+# WebSocket close code sent to evicted connections ("try again later")
+CLOSE_CODE_TRY_AGAIN_LATER = 1013
+
+# WebSocket close code sent when a send to the sketchpad fails
+CLOSE_CODE_INTERNAL_ERROR = 1011
+
+
+class LazyKeys:
+    """Log argument that only builds the key list if the record is emitted."""
+
+    __slots__ = ("mapping",)
+
+    def __init__(self, mapping: Dict):
+        self.mapping = mapping
+
+    def __str__(self) -> str:
+        return str(list(self.mapping))
+
+
+@dataclass(slots=True)
+class SketchpadState:
+    """All shared state, held on a single instance shared across all modules."""
+
+    # Store WebSocket connections, least recently used first
+    connections: "OrderedDict[str, WebSocket]" = field(default_factory=OrderedDict)
+    # Outbound record queue and the task draining it, per connection
+    send_queues: Dict[str, asyncio.Queue] = field(default_factory=dict)
+    sender_tasks: Dict[str, asyncio.Task] = field(default_factory=dict)
+    # Close tasks for evicted connections, kept referenced until they finish
+    closing_tasks: Set[asyncio.Task] = field(default_factory=set)
+    # The latest Chainlit session ID (for single-user mode)
+    latest_session: Optional[str] = None
+
+
+STATE = SketchpadState()
 
 
 def set_latest_chainlit_session(session_id: str):
     """Set the latest Chainlit session ID."""
-    global latest_chainlit_session
-    latest_chainlit_session = session_id
-    print(f"[STATE] Set latest Chainlit session: {session_id}")
+    STATE.latest_session = session_id
+    logger.debug("Set latest Chainlit session: %s", session_id)
 
 
 def get_latest_chainlit_session() -> Optional[str]:
     """Get the latest Chainlit session ID."""
-    return latest_chainlit_session
+    return STATE.latest_session
+
+
+def _iter_frame_parts(records: List[Tuple[bytes, bytes]]) -> Iterator[bytes]:
+    """Yield each record's length/type header followed by its payload."""
+    for record_type, payload in records:
+        yield struct.pack(">I", len(record_type) + len(payload)) + record_type
+        yield payload
+
+
+def pack_sketchpad_frame(records: List[Tuple[bytes, bytes]]) -> bytes:
+    """Pack (type, payload) records into one frame as [4 byte length][type][payload]..."""
+    # Headers and payloads are joined as separate parts so each payload is copied once
+    return b"".join(_iter_frame_parts(records))
+
+
+async def _run_sketchpad_sender(key: str, websocket: WebSocket, send_queue: asyncio.Queue):
+    """Send queued records, batching everything already waiting into a single frame."""
+    while True:
+        batch = [await send_queue.get()]
+        while True:
+            try:
+                batch.append(send_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        try:
+            await websocket.send_bytes(pack_sketchpad_frame(batch))
+        except Exception:
+            logger.exception("Error sending %d record(s) to sketchpad %s", len(batch), key)
+            break
+        logger.debug("Sent %d record(s) to sketchpad %s", len(batch), key)
+
+    # The socket is unusable; stop accepting records for it and close it
+    if STATE.connections.get(key) is websocket:
+        _stop_sketchpad_sender(key)
+        del STATE.connections[key]
+    with contextlib.suppress(Exception):
+        await websocket.close(code=CLOSE_CODE_INTERNAL_ERROR)
 
 
 def add_sketchpad_connection(key: str, websocket: WebSocket):
-    """Add a sketchpad WebSocket connection."""
-    sketchpad_connections[key] = websocket
-    print(f"[STATE] Added sketchpad connection: {key}, total={list(sketchpad_connections.keys())}")
-
-
-def remove_sketchpad_connection(key: str):
-    """Remove a sketchpad WebSocket connection."""
-    if key in sketchpad_connections:
-        del sketchpad_connections[key]
-        print(f"[STATE] Removed sketchpad connection: {key}")
+    """Add a sketchpad WebSocket connection and start its sender task."""
+    _stop_sketchpad_sender(key)
+    replaced = STATE.connections.pop(key, None)
+    if replaced is not None and replaced is not websocket:
+        _close_in_background(replaced, CLOSE_CODE_TRY_AGAIN_LATER)
+        logger.debug("Replaced sketchpad connection: %s", key)
+    while len(STATE.connections) >= MAX_SKETCHPAD_CONNECTIONS:
+        _evict_sketchpad_connection()
+
+    send_queue: asyncio.Queue = asyncio.Queue(maxsize=SKETCHPAD_SEND_QUEUE_SIZE)
+    STATE.connections[key] = websocket
+    STATE.send_queues[key] = send_queue
+    STATE.sender_tasks[key] = asyncio.create_task(
+        _run_sketchpad_sender(key, websocket, send_queue)
+    )
+    logger.debug("Added sketchpad connection: %s, total=%s", key, LazyKeys(STATE.connections))
+
+
+def _evict_sketchpad_connection():
+    """Drop the least recently used connection and close its socket."""
+    key, websocket = STATE.connections.popitem(last=False)
+    _stop_sketchpad_sender(key)
+    _close_in_background(websocket, CLOSE_CODE_TRY_AGAIN_LATER)
+    logger.warning("Evicted sketchpad connection: %s", key)
+
+
+def _close_in_background(websocket: WebSocket, code: int):
+    """Close a socket that is no longer tracked without waiting for it."""
+    task = asyncio.create_task(websocket.close(code=code))
+    STATE.closing_tasks.add(task)
+    task.add_done_callback(STATE.closing_tasks.discard)
+
+
+def _stop_sketchpad_sender(key: str):
+    """Cancel the sender task for a connection and drop its queue."""
+    task = STATE.sender_tasks.pop(key, None)
+    if task and task is not asyncio.current_task():
+        task.cancel()
+    STATE.send_queues.pop(key, None)
+
+
+def remove_sketchpad_connection(key: str, websocket: WebSocket):
+    """Remove a sketchpad WebSocket connection, unless it has since been replaced."""
+    if STATE.connections.get(key) is not websocket:
+        return
+    _stop_sketchpad_sender(key)
+    del STATE.connections[key]
+    logger.debug("Removed sketchpad connection: %s", key)
+
+
+def enqueue_sketchpad_record(key: str, record_type: bytes, payload: bytes) -> bool:
+    """Queue a record for a sketchpad connection. Returns False if it was not queued."""
+    send_queue = STATE.send_queues.get(key)
+    if send_queue is None:
+        logger.debug("No sketchpad connection for key %s", key)
+        return False
+    try:
+        send_queue.put_nowait((record_type, payload))
+    except asyncio.QueueFull:
+        logger.warning("Send queue for sketchpad %s is full, dropping record", key)
+        return False
+    STATE.connections.move_to_end(key)
+    return True
 
 
 def get_sketchpad_connection(key: str) -> Optional[WebSocket]:
-    """Get a sketchpad WebSocket connection."""
-    return sketchpad_connections.get(key)
+    """Get a sketchpad WebSocket connection, marking it as recently used."""
+    websocket = STATE.connections.get(key)
+    if websocket is not None:
+        STATE.connections.move_to_end(key)
+    return websocket
 
 
 def get_all_sketchpad_connections() -> Dict[str, WebSocket]:
     """Get all sketchpad WebSocket connections."""
-    return sketchpad_connections
+    return STATE.connections
 